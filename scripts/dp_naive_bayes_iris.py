@@ -2,147 +2,282 @@
 
 import argparse
 import csv
-import math
-import random
-from collections import defaultdict
-from typing import List, Tuple
-
+import json
+import os
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+# Numba is opt-in (DP_NB_NUMBA=1): on Iris-sized inputs its import costs far more
+# than the kernels save, and every experiment worker process would pay it
+njit = None
+if os.environ.get('DP_NB_NUMBA') == '1':
+    try:
+        from numba import njit
+    except ImportError:  # Numba is optional; the NumPy kernels below are used instead
+        pass
+
+
+def _accumulate_stats_numpy(X, y_idx, n_classes, sums, sumsqs, counts):
+    # Scatter-add rows into their class slot instead of one masked copy per class
+    counts[:] = np.bincount(y_idx, minlength=n_classes)
+    sums[:] = 0.0
+    sumsqs[:] = 0.0
+    np.add.at(sums, y_idx, X)
+    np.add.at(sumsqs, y_idx, np.square(X))
+
+
+def _score_numpy(X, means, inv_var, log_prior, log_norm, out):
+    diff = X[:, None, :] - means[None, :, :]
+    quad = (diff * diff * inv_var[None, :, :]).sum(-1)
+    out[:] = log_prior + log_norm - 0.5 * quad
+
+
+if njit is not None:
+    # One pass over X fills every per-class reduction, no boolean-mask copies
+    @njit(cache=True)
+    def _accumulate_stats(X, y_idx, n_classes, sums, sumsqs, counts):
+        sums[:] = 0.0
+        sumsqs[:] = 0.0
+        counts[:] = 0.0
+        for i in range(X.shape[0]):
+            c = y_idx[i]
+            counts[c] += 1.0
+            for j in range(X.shape[1]):
+                v = X[i, j]
+                sums[c, j] += v
+                sumsqs[c, j] += v * v
+
+    # Fused subtract/square/divide/reduce, avoiding the (N, C, F) temporary.
+    # Serial on purpose: the score matrix is tiny and the experiment grid
+    # already runs one trial per worker process.
+    @njit(cache=True, fastmath=True)
+    def _score(X, means, inv_var, log_prior, log_norm, out):
+        for i in range(X.shape[0]):
+            for c in range(means.shape[0]):
+                q = 0.0
+                for j in range(X.shape[1]):
+                    d = X[i, j] - means[c, j]
+                    q += d * d * inv_var[c, j]
+                out[i, c] = log_prior[c] + log_norm[c] - 0.5 * q
+else:
+    _accumulate_stats = _accumulate_stats_numpy
+    _score = _score_numpy
+
+
+class Model(NamedTuple):
+    # Structure-of-arrays DP Gaussian NB model; row c of each array is classes[c]
+    means: np.ndarray      # (C, F)
+    vars_: np.ndarray      # (C, F)
+    inv_var: np.ndarray    # (C, F)
+    log_prior: np.ndarray  # (C,)
+    log_norm: np.ndarray   # (C,)
+    classes: List[str]
+
+
+class SufficientStats(NamedTuple):
+    # Non-private per-class statistics; these do not change between DP trials
+    stats: np.ndarray      # (C, 1 + 2F) rows of [count, *sums, *sumsq]
+    feat_mins: np.ndarray  # (F,) clamp ranges
+    feat_maxs: np.ndarray  # (F,)
+    classes: List[str]
+
+
+def read_iris(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    # Four float columns and a label column into a structured array; blank lines are skipped
+    arr = np.genfromtxt(path, delimiter=',', dtype=None, encoding='utf-8')
+    X = np.stack([arr[f'f{i}'] for i in range(4)], axis=1).astype(np.float64)
+    y = np.char.strip(arr['f4'])
+    return X, y
+
+
+def split_epsilon(epsilon: float, eps_count: float = None, eps_sum: float = None, eps_sumsq: float = None):
+    # Partition epsilon if parts not provided
+    if eps_count is None or eps_sum is None or eps_sumsq is None:
+        # Simple allocation: 20% to counts, 40% to sums, 40% to sumsq
+        eps_count = 0.2 * epsilon
+        eps_sum = 0.4 * epsilon
+        eps_sumsq = 0.4 * epsilon
+    return eps_count, eps_sum, eps_sumsq
 
-def laplace_noise(scale: float, rng: random.Random) -> float:
-    # Draw from Laplace(0, b) where scale = b.
-    u = rng.random() - 0.5
-    return -scale * math.copysign(1.0, u) * math.log(1 - 2 * abs(u))
 
+def precompute_stats(X: np.ndarray, y: np.ndarray) -> SufficientStats:
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    n_features = X.shape[1]
 
-def clamp(x: float, lo: float, hi: float) -> float:
-    return max(lo, min(hi, x))
+    # Determine per-feature clamp ranges from training data (non-private)
+    feat_mins = X.min(0)
+    feat_maxs = X.max(0)
+    Xc = np.clip(X, feat_mins, feat_maxs)
+
+    # dict.fromkeys keeps classes in first-seen order, matching the old defaultdict
+    classes = list(dict.fromkeys(y.tolist()))
+    class_index = {cls: c for c, cls in enumerate(classes)}
+    y_idx = np.asarray([class_index[v] for v in y.tolist()], dtype=np.int64)
+    n_classes = len(classes)
+
+    # True counts and sums (non-private used only to compute clamps and to fallback if noisy count <=0)
+    true_counts = np.empty(n_classes)
+    true_sums = np.empty((n_classes, n_features))
+    true_sumsq = np.empty((n_classes, n_features))
+    _accumulate_stats(Xc, y_idx, n_classes, true_sums, true_sumsq, true_counts)
+
+    stats = np.concatenate([true_counts[:, None], true_sums, true_sumsq], axis=1)
+    return SufficientStats(stats, feat_mins, feat_maxs, classes)
+
+
+def noisy_model_from_stats(
+    suff: SufficientStats,
+    eps_count: float,
+    eps_sum: float,
+    eps_sumsq: float,
+    seed: int = 0,
+) -> Model:
+    rng = np.random.default_rng(seed)
+    feat_mins, feat_maxs = suff.feat_mins, suff.feat_maxs
+    n_features = feat_mins.shape[0]
 
+    # Compute sensitivities
+    sens_count = 1.0
+    sens_sum = feat_maxs - feat_mins
+    sens_sumsq = feat_maxs * feat_maxs - feat_mins * feat_mins
+    # Laplace scales for the [count, *sums, *sumsq] row of each class
+    scale_vec = np.concatenate([[sens_count / eps_count], sens_sum / eps_sum, sens_sumsq / eps_sumsq])
+
+    # Classes are disjoint (parallel composition), so one Laplace draw covers the whole block
+    scales = np.broadcast_to(scale_vec, suff.stats.shape)
+    noisy = suff.stats + rng.laplace(0.0, scales)
+    # Ensure count at least 1 to avoid division by zero; clip to small positive if necessary
+    counts = np.maximum(1.0, noisy[:, 0])
+    noisy_sums = noisy[:, 1:1 + n_features]
+    noisy_sumsq = noisy[:, 1 + n_features:]
+
+    # Compute DP mean and variance (population variance: E[x^2] - E[x]^2)
+    mean_arr = noisy_sums / counts[:, None]
+    var_arr = noisy_sumsq / counts[:, None] - mean_arr * mean_arr
+    # numerical stability: variances must be non-negative
+    var_arr[var_arr <= 1e-8] = 1e-6
 
-def read_iris(path: str) -> List[Tuple[List[float], str]]:
-    rows = []
-    with open(path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = [p.strip() for p in line.split(',')]
-            if len(parts) < 5:
-                continue
-            features = [float(parts[i]) for i in range(4)]
-            label = parts[4]
-            rows.append((features, label))
-    return rows
+    # Compute class priors from noisy counts (normalized)
+    priors = counts / counts.sum()
+    return Model(
+        means=mean_arr,
+        vars_=var_arr,
+        inv_var=1.0 / var_arr,
+        log_prior=np.log(np.maximum(priors, 1e-12)),
+        # Gaussian normalizer is fixed at training time
+        log_norm=-0.5 * np.log(2 * np.pi * var_arr).sum(1),
+        classes=suff.classes,
+    )
 
 
 def dp_gaussian_nb_train(
-    rows: List[Tuple[List[float], str]],
+    X: np.ndarray,
+    y: np.ndarray,
     epsilon: float,
     eps_count: float = None,
     eps_sum: float = None,
     eps_sumsq: float = None,
     seed: int = 0,
 ):
-    rng = random.Random(seed)
+    eps_count, eps_sum, eps_sumsq = split_epsilon(epsilon, eps_count, eps_sum, eps_sumsq)
+    suff = precompute_stats(X, y)
+    model = noisy_model_from_stats(suff, eps_count, eps_sum, eps_sumsq, seed)
 
-    # Partition epsilon if parts not provided
-    if eps_count is None or eps_sum is None or eps_sumsq is None:
-        # Simple allocation: 20% to counts, 40% to sums, 40% to sumsq
-        eps_count = 0.2 * epsilon
-        eps_sum = 0.4 * epsilon
-        eps_sumsq = 0.4 * epsilon
+    # Return model and clamp ranges (for applying to test set)
+    return model, suff.feat_mins, suff.feat_maxs
 
-    # Gather training stats per class
-    classes = defaultdict(list)
-    for features, label in rows:
-        classes[label].append(features)
 
-    n_features = len(rows[0][0])
+def predict(model: Model, feat_mins, feat_maxs, X: np.ndarray) -> List[str]:
+    # clamp test features
+    X = np.clip(np.asarray(X, dtype=np.float64), feat_mins, feat_maxs)
+    # Gaussian log-prob summed over features, scored for every (row, class) pair at once
+    scores = np.empty((X.shape[0], len(model.classes)))
+    _score(X, model.means, model.inv_var, model.log_prior, model.log_norm, scores)
+    return [model.classes[i] for i in scores.argmax(1)]
 
-    # Determine per-feature clamp ranges from training data (non-private)
-    feat_mins = [float('inf')] * n_features
-    feat_maxs = [float('-inf')] * n_features
-    for feats, _ in rows:
-        for j, v in enumerate(feats):
-            feat_mins[j] = min(feat_mins[j], v)
-            feat_maxs[j] = max(feat_maxs[j], v)
 
-    # Compute sensitivities
-    sens_count = 1.0
-    sens_sum = [feat_maxs[j] - feat_mins[j] for j in range(n_features)]
-    sens_sumsq = [feat_maxs[j] * feat_maxs[j] - feat_mins[j] * feat_mins[j] for j in range(n_features)]
-
-    model = {}
-
-    for cls, cls_rows in classes.items():
-        # True counts and sums (non-private used only to compute clamps and to fallback if noisy count <=0)
-        true_count = len(cls_rows)
-        sums = [0.0] * n_features
-        sumsq = [0.0] * n_features
-        for feats in cls_rows:
-            for j, v in enumerate(feats):
-                v_clamped = clamp(v, feat_mins[j], feat_maxs[j])
-                sums[j] += v_clamped
-                sumsq[j] += v_clamped * v_clamped
-
-        # Add Laplace noise
-        noisy_count = true_count + laplace_noise(sens_count / eps_count, rng)
-        # Ensure count at least 1 to avoid division by zero; clip to small positive if necessary
-        noisy_count = max(1.0, noisy_count)
-
-        noisy_sums = [
-            sums[j] + laplace_noise(sens_sum[j] / eps_sum, rng) for j in range(n_features)
-        ]
-        noisy_sumsq = [
-            sumsq[j] + laplace_noise(sens_sumsq[j] / eps_sumsq, rng) for j in range(n_features)
-        ]
-
-        # Compute DP mean and variance (population variance: E[x^2] - E[x]^2)
-        means = [noisy_sums[j] / noisy_count for j in range(n_features)]
-        variances = []
-        for j in range(n_features):
-            ex2 = noisy_sumsq[j] / noisy_count
-            ex = means[j]
-            var = ex2 - ex * ex
-            # numerical stability: variances must be non-negative
-            if var <= 1e-8:
-                var = 1e-6
-            variances.append(var)
-
-        model[cls] = {
-            'count': noisy_count,
-            'mean': means,
-            'var': variances,
-        }
+# Train/test split matching earlier script: test indices 1-10,51-60,101-110 (1-based)
+TEST_INDICES = [i - 1 for i in list(range(1, 11)) + list(range(51, 61)) + list(range(101, 111))]
 
-    # Compute class priors from noisy counts (normalized)
-    total_noisy = sum(model[cls]['count'] for cls in model)
-    for cls in model:
-        model[cls]['prior'] = model[cls]['count'] / total_noisy
 
-    # Return model and clamp ranges (for applying to test set)
-    return model, feat_mins, feat_maxs
-
-
-def predict(model, feat_mins, feat_maxs, X: List[List[float]]) -> List[str]:
-    preds = []
-    for x in X:
-        best = None
-        best_score = float('-inf')
-        for cls, stats in model.items():
-            # clamp test features
-            x_clamped = [clamp(x[j], feat_mins[j], feat_maxs[j]) for j in range(len(x))]
-            # compute log-likelihood under Gaussian per feature
-            logp = math.log(max(stats['prior'], 1e-12))
-            for j, val in enumerate(x_clamped):
-                mu = stats['mean'][j]
-                var = stats['var'][j]
-                # Gaussian log-prob
-                logp += -0.5 * math.log(2 * math.pi * var) - 0.5 * ((val - mu) ** 2) / var
-            if logp > best_score:
-                best_score = logp
-                best = cls
-        preds.append(best)
-    return preds
+def heldout_mask(n: int, test_indices=TEST_INDICES) -> np.ndarray:
+    mask = np.zeros(n, dtype=bool)
+    mask[list(test_indices)] = True
+    return mask
+
+
+def trial_from_stats(
+    epsilon: float,
+    seed: int,
+    suff: SufficientStats,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    eps_count: float = None,
+    eps_sum: float = None,
+    eps_sumsq: float = None,
+):
+    # One DP trial reusing precomputed training statistics; only the noise changes
+    eps_count, eps_sum, eps_sumsq = split_epsilon(epsilon, eps_count, eps_sum, eps_sumsq)
+    model = noisy_model_from_stats(suff, eps_count, eps_sum, eps_sumsq, seed)
+    preds = predict(model, suff.feat_mins, suff.feat_maxs, X_test)
+
+    correct = sum(1 for p, t in zip(preds, y_test) if p == t)
+    acc = correct / len(y_test)
+    return acc, preds
+
+
+def train_and_predict(
+    epsilon: float,
+    seed: int,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    eps_count: float = None,
+    eps_sum: float = None,
+    eps_sumsq: float = None,
+):
+    # One DP trial on an already-split dataset; returns (accuracy, preds)
+    return trial_from_stats(
+        epsilon,
+        seed,
+        precompute_stats(X_train, y_train),
+        X_test,
+        y_test,
+        eps_count=eps_count,
+        eps_sum=eps_sum,
+        eps_sumsq=eps_sumsq,
+    )
+
+
+def run(
+    epsilon: float,
+    seed: int,
+    X: np.ndarray,
+    y: np.ndarray,
+    test_indices=TEST_INDICES,
+    eps_count: float = None,
+    eps_sum: float = None,
+    eps_sumsq: float = None,
+):
+    # Train on everything outside test_indices and score the held-out rows.
+    # Returns (accuracy, pairs) with pairs as (0-based index, true, pred).
+    mask = heldout_mask(len(y), test_indices)
+    y_test = y[mask].tolist()
+    acc, preds = train_and_predict(
+        epsilon,
+        seed,
+        X[~mask],
+        y[~mask],
+        X[mask],
+        y_test,
+        eps_count=eps_count,
+        eps_sum=eps_sum,
+        eps_sumsq=eps_sumsq,
+    )
+    return acc, list(zip(np.flatnonzero(mask).tolist(), y_test, preds))
 
 
 def main():
@@ -153,36 +288,30 @@ def main():
     parser.add_argument('--eps-sumsq', type=float, default=None)
     parser.add_argument('--data-path', type=str, default='data/iris.data')
     parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='emit a single JSON line instead of the text report')
     args = parser.parse_args()
 
-    rows = read_iris(args.data_path)
-
-    # Prepare train/test split matching earlier script: test indices 1-10,51-60,101-110 (1-based)
-    test_indices = set([i - 1 for i in list(range(1, 11)) + list(range(51, 61)) + list(range(101, 111))])
-    train = [r for i, r in enumerate(rows) if i not in test_indices]
-    test = [r for i, r in enumerate(rows) if i in test_indices]
-
-    model, feat_mins, feat_maxs = dp_gaussian_nb_train(
-        train,
+    X, y = read_iris(args.data_path)
+    acc, pairs = run(
         args.epsilon,
+        args.seed,
+        X,
+        y,
+        TEST_INDICES,
         eps_count=args.eps_count,
         eps_sum=args.eps_sum,
         eps_sumsq=args.eps_sumsq,
-        seed=args.seed,
     )
 
-    X_test = [x for x, _ in test]
-    y_test = [y for _, y in test]
-    preds = predict(model, feat_mins, feat_maxs, X_test)
-
-    correct = sum(1 for p, t in zip(preds, y_test) if p == t)
-    acc = correct / len(y_test)
+    if args.json:
+        # pairs are (0-based index, true, pred), as returned by run()
+        print(json.dumps({'accuracy': acc, 'pairs': pairs}))
+        return
 
     print(f"DP GaussianNB with epsilon={args.epsilon:.4f}")
-    print(f"Train size: {len(train)}  Test size: {len(test)}  Accuracy: {acc:.4f}")
+    print(f"Train size: {len(y) - len(pairs)}  Test size: {len(pairs)}  Accuracy: {acc:.4f}")
     print("Per-instance (index, true, pred):")
-    idxs = [i for i in range(len(rows)) if i in test_indices]
-    for idx, t, p in zip(idxs, y_test, preds):
+    for idx, t, p in pairs:
         print(f"{idx+1}: {t} -> {p}")
 
 
@@ -7,78 +7,58 @@ per-epsilon metrics.
 import argparse
 import csv
 import os
-import subprocess
-import sys
-import re
-from collections import defaultdict
 from typing import List
 
+import numpy as np
 
-TEST_INDICES = [i - 1 for i in list(range(1, 11)) + list(range(51, 61)) + list(range(101, 111))]
+from dp_naive_bayes_iris import heldout_mask, precompute_stats, read_iris, trial_from_stats
 
 
-def run_dp(python_exec: str, script_path: str, epsilon: float, seed: int):
-    cmd = [python_exec, script_path, '--epsilon', str(epsilon), '--seed', str(seed)]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if proc.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\nStderr:\n{proc.stderr}")
-    out = proc.stdout
-    # parse lines 
-    preds = {}
-    for line in out.splitlines():
-        m = re.match(r'^(\d+):\s*(\S+)\s*->\s*(\S+)', line)
-        if m:
-            idx = int(m.group(1)) - 1
-            true = m.group(2)
-            pred = m.group(3)
-            preds[idx] = (true, pred)
-    missing = [i for i in TEST_INDICES if i not in preds]
-    if missing:
-        raise RuntimeError(f"Missing predictions for indices: {missing}\nOutput:\n{out}")
+def run_dp(suff, X_test, y_test, epsilon: float, seed: int):
+    _, preds = trial_from_stats(epsilon, seed, suff, X_test, y_test)
     # return list of (true, pred) ordered by TEST_INDICES
-    return [preds[i] for i in TEST_INDICES]
+    return list(zip(y_test, preds))
 
 
 def precision_recall_from_pairs(pairs: List[tuple]):
     # pairs: list of (true_label, pred_label)
-    labels = sorted({t for t, p in pairs} | {p for t, p in pairs})
-    tp = defaultdict(int)
-    fp = defaultdict(int)
-    fn = defaultdict(int)
-    for t, p in pairs:
-        if t == p:
-            tp[t] += 1
-        else:
-            fp[p] += 1
-            fn[t] += 1
-    precision = {}
-    recall = {}
-    for l in labels:
-        prec = tp[l] / (tp[l] + fp[l]) if (tp[l] + fp[l]) > 0 else 0.0
-        rec = tp[l] / (tp[l] + fn[l]) if (tp[l] + fn[l]) > 0 else 0.0
-        precision[l] = prec
-        recall[l] = rec
+    t_arr = np.asarray([t for t, _ in pairs])
+    p_arr = np.asarray([p for _, p in pairs])
+    n = len(pairs)
+    labels, inv = np.unique(np.concatenate([t_arr, p_arr]), return_inverse=True)
+    k = len(labels)
+    # confusion matrix: rows are true labels, columns are predictions
+    conf = np.zeros((k, k), dtype=np.int64)
+    np.add.at(conf, (inv[:n], inv[n:]), 1)
+    tp = np.diag(conf)
+    fp = conf.sum(0) - tp
+    fn = conf.sum(1) - tp
+    prec = tp / np.maximum(tp + fp, 1)
+    rec = tp / np.maximum(tp + fn, 1)
+    precision = dict(zip(labels.tolist(), prec.tolist()))
+    recall = dict(zip(labels.tolist(), rec.tolist()))
     # macro averages
-    macro_prec = sum(precision.values()) / len(precision)
-    macro_rec = sum(recall.values()) / len(recall)
-    return precision, recall, macro_prec, macro_rec
+    return precision, recall, float(prec.mean()), float(rec.mean())
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--epsilons', nargs='+', type=float, default=[0.5, 1, 2, 4, 8, 16])
     parser.add_argument('--seed', type=int, default=42)
-    parser.add_argument('--dp-script', type=str, default='scripts/dp_naive_bayes_iris.py')
+    parser.add_argument('--data-path', type=str, default='data/iris.data')
     parser.add_argument('--out-csv', type=str, default='outputs/dp_nb_pr.csv')
     args = parser.parse_args()
 
-    python_exec = sys.executable
-    script_path = os.path.abspath(args.dp_script)
+    # Load and split once; every epsilon reuses the same in-memory arrays
+    X, y = read_iris(args.data_path)
+    mask = heldout_mask(len(y))
+    # True class statistics are identical for every trial; only the noise differs
+    split = (precompute_stats(X[~mask], y[~mask]), X[mask], y[mask].tolist())
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
 
     rows = []
     for eps in args.epsilons:
-        pairs = run_dp(python_exec, script_path, eps, args.seed)
+        pairs = run_dp(*split, eps, args.seed)
         precision, recall, macro_p, macro_r = precision_recall_from_pairs(pairs)
         # record per-class and macro
         for cls in sorted(precision.keys()):
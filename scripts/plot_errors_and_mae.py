@@ -1,6 +1,5 @@
 import os
-import math
-import statistics
+import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -36,29 +35,13 @@ noisy_files = {
 # Helpers
 
 def read_noisy(path):
-    vals = []
-    with open(path) as f:
-        for l in f:
-            try:
-                vals.append(float(l.strip()))
-            except:
-                pass
-    return vals
+    # one noisy release per line
+    return np.loadtxt(path, dtype=np.float64, ndmin=1)
 
 def true_avg(path):
-    vals = []
-    with open(path) as f:
-        for l in f:
-            t = l.strip()
-            if not t: continue
-            tok = t.split(',')[0].strip()
-            try:
-                age = int(tok)
-                if age > 25:
-                    vals.append(age)
-            except:
-                continue
-    return sum(vals) / len(vals)
+    # first column is the integer age
+    ages = np.loadtxt(path, delimiter=',', usecols=0, dtype=np.int64)
+    return ages[ages > 25].mean()
 
 # Load true averages
 true_avgs = {}
@@ -77,9 +60,9 @@ for eps, mapping in noisy_files.items():
             mae[eps][key] = None
             continue
         ta = true_avgs[key]
-        errs = [abs(v - ta) for v in vals]
+        errs = np.abs(vals - ta)
         errors[eps][key] = errs
-        mae[eps][key] = statistics.mean(errs)
+        mae[eps][key] = errs.mean()
 
 # Plot 1: overlayed histograms per dataset (4 subplots)
 fig, axes = plt.subplots(2, 2, figsize=(12, 8), sharex=True, sharey=True)
@@ -3,58 +3,43 @@
 import argparse
 import csv
 import os
-import re
-import subprocess
-import sys
-import statistics
-
-
-def run_trial(python_exec, script_path, epsilon, seed):
-    cmd = [python_exec, script_path, '--epsilon', str(epsilon), '--seed', str(seed)]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if proc.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\nStderr:\n{proc.stderr}")
-    out = proc.stdout
-    # Find the Accuracy line
-    m = re.search(r'Accuracy:\s*([0-9]*\.?[0-9]+)', out)
-    if not m:
-        raise RuntimeError(f"Couldn't parse accuracy from output:\n{out}")
-    acc = float(m.group(1))
-    # Parse per-instance true/pred lines like: "1: Iris-setosa -> Iris-virginica"
-    pairs = []
-    for line in out.splitlines():
-        pm = re.match(r'^(\d+):\s*(\S+)\s*->\s*(\S+)', line)
-        if pm:
-            idx = int(pm.group(1))
-            true = pm.group(2)
-            pred = pm.group(3)
-            pairs.append((true, pred))
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from dp_naive_bayes_iris import heldout_mask, precompute_stats, read_iris, trial_from_stats
+from dp_nb_precision_recall import precision_recall_from_pairs
+
+
+def score_preds(y_test, preds, with_pr=True):
+    correct = sum(1 for p, t in zip(preds, y_test) if p == t)
+    acc = correct / len(y_test)
+    pairs = list(zip(y_test, preds))
 
     # Compute macro-precision and macro-recall from pairs if available
     macro_prec = None
     macro_rec = None
-    if pairs:
-        labels = sorted({t for t, p in pairs} | {p for t, p in pairs})
-        tp = {l: 0 for l in labels}
-        fp = {l: 0 for l in labels}
-        fn = {l: 0 for l in labels}
-        for t, p in pairs:
-            if t == p:
-                tp[t] += 1
-            else:
-                fp[p] += 1
-                fn[t] += 1
-        precs = []
-        recs = []
-        for l in labels:
-            prec = tp[l] / (tp[l] + fp[l]) if (tp[l] + fp[l]) > 0 else 0.0
-            rec = tp[l] / (tp[l] + fn[l]) if (tp[l] + fn[l]) > 0 else 0.0
-            precs.append(prec)
-            recs.append(rec)
-        macro_prec = sum(precs) / len(precs)
-        macro_rec = sum(recs) / len(recs)
-
-    return acc, macro_prec, macro_rec, out
+    if with_pr and pairs:
+        _, _, macro_prec, macro_rec = precision_recall_from_pairs(pairs)
+
+    return acc, macro_prec, macro_rec
+
+
+def run_trial(suff, X_test, y_test, with_pr, epsilon, seed):
+    _, preds = trial_from_stats(epsilon, seed, suff, X_test, y_test)
+    return score_preds(y_test, preds, with_pr)
+
+
+def run_grid_jax(X_train, y_train, X_test, y_test, epsilons, seeds, with_pr=True):
+    # Imported lazily so JAX stays an optional dependency
+    from dp_naive_bayes_jax import run_trials
+
+    results = []
+    for eps in epsilons:
+        for preds in run_trials(eps, seeds, X_train, y_train, X_test):
+            results.append(score_preds(y_test, preds, with_pr))
+    return results
 
 
 def main():
@@ -62,21 +47,37 @@ def main():
     parser.add_argument('--epsilons', nargs='+', type=float, default=[0.5, 1, 2, 4, 8, 16])
     parser.add_argument('--trials', type=int, default=10)
     parser.add_argument('--seed-base', type=int, default=0)
-    parser.add_argument('--dp-script', type=str, default='scripts/dp_naive_bayes_iris.py')
+    parser.add_argument('--data-path', type=str, default='data/iris.data')
     parser.add_argument('--out-csv', type=str, default='outputs/dp_nb_results.csv')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for the trial grid (default: os.cpu_count())')
+    parser.add_argument('--no-pr', action='store_true', help='skip macro precision/recall, report accuracy only')
+    parser.add_argument('--backend', choices=['numpy', 'jax'], default='numpy', help='jax runs all trials of an epsilon as one jitted, vmapped call')
     args = parser.parse_args()
 
-    python_exec = sys.executable
-    script_path = os.path.abspath(args.dp_script)
+    # Load and split once; every trial reuses the same in-memory arrays
+    X, y = read_iris(args.data_path)
+    mask = heldout_mask(len(y))
+    y_test = y[mask].tolist()
 
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
 
+    seeds = [args.seed_base + t for t in range(args.trials)]
+    if args.backend == 'jax':
+        results = run_grid_jax(X[~mask], y[~mask], X[mask], y_test, args.epsilons, seeds, not args.no_pr)
+    else:
+        # True class statistics are identical for every trial; only the noise differs
+        split = (precompute_stats(X[~mask], y[~mask]), X[mask], y_test, not args.no_pr)
+        # Every (epsilon, seed) trial is independent, so run the whole grid across cores
+        tasks = [(eps, seed) for eps in args.epsilons for seed in seeds]
+        with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count()) as ex:
+            results = list(ex.map(partial(run_trial, *split), *zip(*tasks)))
+
     rows = []
-    for eps in args.epsilons:
+    for i, eps in enumerate(args.epsilons):
         print(f"Running epsilon={eps} ({args.trials} trials)")
         for t in range(args.trials):
             seed = args.seed_base + t
-            acc, prec, rec, out = run_trial(python_exec, script_path, eps, seed)
+            acc, prec, rec = results[i * args.trials + t]
             prec_str = f"{prec:.4f}" if prec is not None else 'NA'
             rec_str = f"{rec:.4f}" if rec is not None else 'NA'
             print(f"  trial {t+1}/{args.trials}: acc={acc:.4f} prec={prec_str} rec={rec_str}")
@@ -97,20 +98,20 @@ def main():
     # compute summaries for accuracy and recall
     for eps in sorted(eps_map.keys()):
         vals = eps_map[eps]
-        mean = statistics.mean(vals)
-        stdev = statistics.pstdev(vals)
+        mean = float(np.mean(vals))
+        stdev = float(np.std(vals))
         # collect recalls if present
         recs = [r['recall'] for r in rows if r['epsilon'] == eps and r['recall'] != '']
         precs = [r['precision'] for r in rows if r['epsilon'] == eps and r['precision'] != '']
         if recs:
-            mean_rec = statistics.mean(recs)
-            std_rec = statistics.pstdev(recs)
+            mean_rec = float(np.mean(recs))
+            std_rec = float(np.std(recs))
         else:
             mean_rec = None
             std_rec = None
         if precs:
-            mean_prec = statistics.mean(precs)
-            std_prec = statistics.pstdev(precs)
+            mean_prec = float(np.mean(precs))
+            std_prec = float(np.std(precs))
         else:
             mean_prec = None
             std_prec = None
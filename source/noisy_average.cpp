@@ -22,16 +22,16 @@ static inline std::string &rtrim(std::string &s) {
 }
 static inline std::string &trim(std::string &s) { return ltrim(rtrim(s)); }
 
-// Laplace noise generator using inverse CDF
+// Laplace noise generator: difference of two Exp(1) draws, b*(log(U1) - log(U2)).
+// unif(0,1) can return exactly 0, which sent log(0) to -inf in the old
+// inverse-CDF form; drawing on (0, 1] keeps the output finite, and both tails
+// are truncated the same way (|noise| <= b*log(2^53)).
 double sample_laplace(double scale, std::mt19937_64 &rng) {
     std::uniform_real_distribution<double> unif(0.0, 1.0);
-    double u = unif(rng);
-    if (u == 0.5) return 0.0;
-    if (u < 0.5) {
-        return scale * std::log(2.0 * u);
-    } else {
-        return -scale * std::log(2.0 * (1.0 - u));
-    }
+    // 1 - u lies in (0, 1], so log() stays finite
+    double u1 = 1.0 - unif(rng);
+    double u2 = 1.0 - unif(rng);
+    return scale * (std::log(u1) - std::log(u2));
 }
 
 struct Record { int idx; int age; string line; };